@@ -0,0 +1,73 @@
+# benchmark.py
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import matplotlib
+matplotlib.use('Agg')  # benchmark nie wyświetla okien
+
+import box_notes as bn
+import stave_separator as ss
+from image_io import load_image
+from pipeline_config import PROFILES
+
+
+def run_pipeline(image, profile):
+    """
+    Przepuszcza obraz przez stave_separator i box_notes dla danego profilu.
+    Zwraca (liczba pięciolinii, liczba wykrytych symboli).
+    """
+    result = ss.process_image(image, config=profile)
+    if result is None:
+        return 0, 0
+    staffs, gaps = result
+    symbols = sum(len(bn.detect_symbols(staff, gap, config=profile)) for staff, gap in zip(staffs, gaps))
+    return len(staffs), symbols
+
+
+def benchmark(paths, profiles, repeat=3):
+    """
+    Dla każdego obrazu i profilu mierzy medianę czasu całego potoku (z repeat powtórzeń)
+    oraz liczbę wykrytych pięciolinii i symboli.
+    Zwraca listę krotek: (profil, nazwa pliku, czas [ms], pięciolinie, symbole).
+    """
+    rows = []
+    for path in paths:
+        image = load_image(path, grayscale=True)
+        if image is None:
+            print(f"Pominięto {path} – nie udało się wczytać obrazu")
+            continue
+        for profile in profiles:
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                staffs, symbols = run_pipeline(image, profile)
+                times.append((time.perf_counter() - start) * 1000)
+            rows.append((profile, os.path.basename(path), statistics.median(times), staffs, symbols))
+    return rows
+
+
+def print_report(rows, profiles):
+    print(f"{'profil':<10} {'obraz':<32} {'czas [ms]':>10} {'pięciolinie':>12} {'symbole':>8}")
+    for profile, name, ms, staffs, symbols in rows:
+        print(f"{profile:<10} {name:<32} {ms:>10.1f} {staffs:>12} {symbols:>8}")
+
+    print()
+    print(f"{'profil':<10} {'suma [ms]':>10} {'pięciolinie':>12} {'symbole':>8}")
+    for profile in profiles:
+        selected = [r for r in rows if r[0] == profile]
+        print(f"{profile:<10} {sum(r[2] for r in selected):>10.1f} "
+              f"{sum(r[3] for r in selected):>12} {sum(r[4] for r in selected):>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Czas działania i liczba detekcji dla profili potoku")
+    parser.add_argument('images', nargs='*', help="obrazy do przetworzenia (domyślnie data/*)")
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob(os.path.join('data', '*')))
+    print_report(benchmark(paths, args.profiles, args.repeat), args.profiles)
@@ -1,31 +1,31 @@
 import cv2
-import math
 import matplotlib.pyplot as plt
+import numpy as np
 
-from music_symbol import MusicSymbol
+from image_io import load_image, to_bgr, to_gray, to_rgb
+from music_symbol import MusicSymbol, SymbolBatch
+from pipeline_config import get_profile
+from symbol_components import find_components
 
 
 
-def is_circular(cnt, circularity_thresh_low=0.6, circularity_thresh_high=1.3):
+def is_circular(component, circularity_thresh_low=0.6, circularity_thresh_high=1.3, aspect_low=0.5, aspect_high=1.3):
     """
-    Funkcja oblicza miarę kołowości konturu:
+    Funkcja sprawdza miarę kołowości konturu (SymbolComponent):
        circularity = 4*pi * (area) / (perimeter^2)
     Dla idealnego koła wartość ta wynosi 1.0.
-    Ustawiając dolny próg na 0.1, akceptujemy również kontury z wewnętrznymi otworami.
+    Pole liczone jest z zewnętrznego konturu, więc akceptujemy również kontury z wewnętrznymi otworami.
+    Pole, minAreaRect i obwód są już policzone w find_components, więc tutaj
+    nie wykonujemy żadnych dodatkowych przebiegów po konturze.
     """
-    (_, _), (w, h), _ = cv2.minAreaRect(cnt)
-    aspect_ratio = w / h if h != 0 else 0
+    aspect_ratio = component.aspect_ratio
 
-    if 1.3 < aspect_ratio or aspect_ratio < 0.5:
+    if aspect_high < aspect_ratio or aspect_ratio < aspect_low:
         return False
 
-
-    perimeter = cv2.arcLength(cnt, True)
-    if perimeter == 0:
+    if component.perimeter == 0:
         return False
-    area = cv2.contourArea(cnt)
-    circularity = 4 * math.pi * area / (perimeter ** 2)
-    return circularity_thresh_low <= circularity <= circularity_thresh_high
+    return circularity_thresh_low <= component.circularity <= circularity_thresh_high
 
 
 def remove_lines(binary_image, line_length_ratio=0.5, debug=False):
@@ -77,97 +77,254 @@ def remove_lines(binary_image, line_length_ratio=0.5, debug=False):
     return result
 
 
-def detect_symbols(image, gap, debug=False):
+def clean_symbols(lines_removed, close_kernel_size=7, open_kernel_size=3):
     """
-    Pipeline do wykrywania wyłącznie okrągłych obiektów.
+    Operacje morfologiczne porządkujące kształty po usunięciu linii:
+    closing (zamyka otwory w okrągłych obiektach) i opening (usuwa drobne szumy).
+    open_kernel_size = 0 pomija otwarcie.
+    """
+    kernel_close = cv2.getStructuringElement(cv2.MORPH_RECT, (close_kernel_size, close_kernel_size))
+    processed = cv2.morphologyEx(lines_removed, cv2.MORPH_CLOSE, kernel_close)
 
-    Kroki:
-      1. Wczytanie obrazu, konwersja do skali szarości i binaryzacja.
-      2. Odwrócenie binaryzowanego obrazu (nuty będą białe, tło czarne).
-      3. Usunięcie poziomych linii (np. pięciolinia) – opcjonalnie, jeśli nie chcemy wykrywać tych linii.
-      4. Opcjonalne operacje morfologiczne (closing/opening), aby „uporządkować” kształty.
-      5. Wykrywanie konturów.
-      6. Filtracja konturów przy pomocy funkcji is_circular.
-      7. Boxowanie wykrytych obiektów.
+    if open_kernel_size:
+        kernel_open = cv2.getStructuringElement(cv2.MORPH_RECT, (open_kernel_size, open_kernel_size))
+        processed = cv2.morphologyEx(processed, cv2.MORPH_OPEN, kernel_open)
+    return processed
+
+
+def overlaps(a, b, min_overlap=0.5):
     """
-    # Wczytanie obrazu
-    bgr = image
-    if bgr is None:
-        print("Błąd wczytania obrazu.")
-        return []
+    Sprawdza, czy bounding boxy dwóch składowych pokrywają się – część wspólna zajmuje
+    co najmniej min_overlap pola mniejszego z nich. W przeciwieństwie do IoU wyłapuje też
+    składowe zawarte w innych (np. główka nuty wewnątrz większej, sklejonej plamy).
+    """
+    ix = max(0, min(a.x + a.w, b.x + b.w) - max(a.x, b.x))
+    iy = max(0, min(a.y + a.h, b.y + b.h) - max(a.y, b.y))
+    smaller = min(a.w * a.h, b.w * b.h)
+    return smaller > 0 and ix * iy / smaller >= min_overlap
 
-    # Konwersja do skali szarości
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
 
+def find_notes(gray, config, scale=1.0, debug=False):
+    """
+    Kroki 1–6 pipeline'u detect_symbols na obrazie w skali szarości
+    (już przeskalowanym według config.detection_scale o czynnik scale – o tyle samo
+    zmniejszane są jądra morfologiczne). Zwraca listę SymbolComponent
+    w układzie współrzędnych tego obrazu.
+    """
     # Binaryzacja – korzystamy z metody Otsu i odwracamy obraz,
     # żeby obiekty miały wartość 255 (białe), a tło 0 (czarne)
     _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     binary_inv = cv2.bitwise_not(binary)
 
     # Usuwanie poziomych linii – można wyłączyć, jeśli nie chcemy usuwać pięciolinii
-    lines_removed = remove_lines(binary_inv, line_length_ratio=0.3, debug=debug)
+    lines_removed = remove_lines(binary_inv, line_length_ratio=config.line_length_ratio, debug=debug)
 
-    # Opcjonalne operacje morfologiczne
-    # Closing z kernelem 5x5, aby zamknąć ewentualne otwory w okrągłych obiektach
-    kernel_close = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
-    closed = cv2.morphologyEx(lines_removed, cv2.MORPH_CLOSE, kernel_close)
+    # Minimalna powierzchnia, żeby pominąć bardzo małe artefakty (możesz dostosować)
+    min_area = config.min_area_ratio * gray.shape[0] * gray.shape[1]
+
+    notes = []
+    for pass_idx, close_kernel_size in enumerate(config.close_kernel_sizes):
+        processed = clean_symbols(lines_removed, scale_kernel(close_kernel_size, scale),
+                                  scale_kernel(config.open_kernel_size, scale))
+
+        if debug and pass_idx == 0:
+            plt.figure(figsize=(6, 5))
+            plt.imshow(processed, cmap='gray')
+            plt.title("Po czyszczeniu")
+            plt.axis('off')
+            plt.show()
+
+        # Jedno wyszukanie konturów – statystyki (pole, bbox, minAreaRect, obwód, wypełnienie)
+        # są współdzielone przez wszystkie klasyfikatory symboli
+        components = find_components(processed, min_area=min_area)
+
+        found = []
+        for component in components:
+            # Sprawdzamy czy kontur jest wystarczająco „okrągła”
+            if not is_circular(component,
+                               circularity_thresh_low=config.circularity_low,
+                               circularity_thresh_high=config.circularity_high,
+                               aspect_low=config.aspect_low,
+                               aspect_high=config.aspect_high):
+                continue
+            # Kolejne przebiegi dokładają tylko składowe, których jeszcze nie znaleziono
+            if pass_idx > 0 and any(overlaps(component, note) for note in notes):
+                continue
+            found.append(component)
+        notes.extend(found)
+
+    return notes
+
+
+def scale_kernel(size, scale):
+    # Rozmiar jądra dla obrazu przeskalowanego o scale (0 – operacja wyłączona)
+    return max(1, int(round(size * scale))) if size else 0
+
+
+def note_windows(notes, gap, shape, scale=1.0, margin_ratio=0.3):
+    """
+    Wyznacza okna wycinków dla wszystkich nut pięciolinii naraz.
+    Każde okno obejmuje całą wysokość pięciolinii i bounding box nuty poszerzony
+    o margin_ratio * gap z obu stron. Współrzędne składowych (z obrazu przeskalowanego
+    o scale) są przeliczane do pełnej rozdzielczości.
 
-    # Opening 3x3, aby usunąć drobne szumy
-    kernel_open = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    processed = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel_open)
+    Zwraca tablicę int32 (N, 4): [x_start, y_start, x_end, y_end], posortowaną według x_start.
+    """
+    h, w = shape[:2]
+    if not notes:
+        return np.zeros((0, 4), dtype=np.int32)
 
-    if debug:
-        plt.figure(figsize=(6, 5))
-        plt.imshow(processed, cmap='gray')
-        plt.title("Po czyszczeniu")
-        plt.axis('off')
-        plt.show()
+    xs = np.array([note.x for note in notes], dtype=np.float64)
+    widths = np.array([note.w for note in notes], dtype=np.float64)
+    x = (xs / scale).astype(np.int32)
+    bw = np.ceil(widths / scale).astype(np.int32)
+    margin = int(margin_ratio * gap)
 
-    # Znalezienie konturów – wybieramy RETR_EXTERNAL, by brać tylko zewnętrzne kształty
-    contours, _ = cv2.findContours(processed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    rects = np.empty((len(notes), 4), dtype=np.int32)
+    rects[:, 0] = np.maximum(x - margin, 0)
+    rects[:, 1] = 0
+    rects[:, 2] = np.minimum(x + bw + margin, w)
+    rects[:, 3] = h - 1
+    return rects[np.argsort(rects[:, 0], kind='stable')]
 
-    overlay = bgr.copy()
-    music_symbols = []
-    h, w = processed.shape
-    image_area = h * w
 
-    # Minimalna powierzchnia, żeby pominąć bardzo małe artefakty (możesz dostosować)
-    min_area = 0.0003 * image_area
+def merge_windows(rects):
+    """
+    Scala nakładające się okna (sąsiednie nuty współdzielą kolumny).
+    Zwraca (spans, group): spans to tablica (M, 2) rozłącznych przedziałów [x_start, x_end),
+    a group[i] to indeks przedziału zawierającego okno i. Okna muszą być posortowane po x_start.
+    """
+    if len(rects) == 0:
+        return np.zeros((0, 2), dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    starts = rects[:, 0]
+    ends = np.maximum.accumulate(rects[:, 2])
+    # Nowy przedział zaczyna się tam, gdzie okno nie nachodzi na żadne wcześniejsze
+    new_span = np.empty(len(rects), dtype=bool)
+    new_span[0] = True
+    new_span[1:] = starts[1:] >= ends[:-1]
+    group = np.cumsum(new_span) - 1
+
+    span_starts = starts[new_span]
+    span_ends = np.append(ends[np.flatnonzero(new_span)[1:] - 1], ends[-1])
+    return np.stack([span_starts, span_ends], axis=1).astype(np.int32), group.astype(np.int32)
+
+
+def resize_windows(gray, rects, size):
+    """
+    Skaluje wszystkie okna do jednego rozmiaru size = (szerokość, wysokość) jednym
+    wektorowym odczytem (najbliższy sąsiad) zamiast osobnego wycinka i resize dla każdej nuty.
+    Zwraca tablicę (N, wysokość, szerokość).
+    """
+    out_w, out_h = size
+    x0, y0, x1, y1 = (rects[:, i, None].astype(np.float64) for i in range(4))
+
+    # Środki pikseli docelowych rzutowane na piksele źródłowe każdego okna
+    cols = x0 + (np.arange(out_w) + 0.5) * (x1 - x0) / out_w
+    rows = y0 + (np.arange(out_h) + 0.5) * (y1 - y0) / out_h
+    cols = np.clip(cols.astype(np.intp), 0, gray.shape[1] - 1)
+    rows = np.clip(rows.astype(np.intp), 0, gray.shape[0] - 1)
 
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area < min_area:
-            continue
+    return gray[rows[:, :, None], cols[:, None, :]]
 
-        # Sprawdzamy czy kontur jest wystarczająco „okrągły”
-        if not is_circular(cnt, circularity_thresh_low=0.4, circularity_thresh_high=1.2):
-            continue
 
-        # Wyznaczamy bounding box dla konturu
-        x, _, bw, _ = cv2.boundingRect(cnt)
-        margin = int(0.3 * gap)
-        x_start = max(x - margin, 0)
-        y_start = 0
-        x_end = min(x + bw + margin, w)
-        y_end = h-1
+def _note_rects(gray, gap, config, debug=False):
+    """
+    Wspólny początek detect_symbols i detect_symbols_batch: przeskalowanie pięciolinii
+    według config.detection_scale(gap), wykrycie nut (find_notes) i wyznaczenie ich okien.
+    Zwraca tablicę (N, 4) okien we współrzędnych obrazu w pełnej rozdzielczości.
+    """
+    detection_gray = gray
+    scale = config.detection_scale(gap, gray.shape)
+    if scale != 1.0:
+        detection_gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    notes = find_notes(detection_gray, config, scale=scale, debug=debug)
+    return note_windows(notes, gap, gray.shape, scale=scale, margin_ratio=config.note_margin_ratio)
+
+
+def detect_symbols(image, gap, debug=False, config=None):
+    """
+    Pipeline do wykrywania wyłącznie okrągłych obiektów.
+
+    Kroki:
+      1. Wczytanie obrazu, konwersja do skali szarości i binaryzacja.
+      2. Odwrócenie binaryzowanego obrazu (nuty będą białe, tło czarne).
+      3. Usunięcie poziomych linii (np. pięciolinia) – opcjonalnie, jeśli nie chcemy wykrywać tych linii.
+      4. Opcjonalne operacje morfologiczne (closing/opening), aby „uporządkować” kształty.
+      5. Wykrywanie konturów (jeden przebieg, statystyki każdego konturu liczone raz).
+      6. Filtracja konturów przy pomocy funkcji is_circular.
+      7. Boxowanie wykrytych obiektów.
+
+    Progi pochodzą z config (profil lub PipelineConfig). Przy config.scale < 1 kroki 1–6
+    wykonywane są na obrazie pomniejszonym według config.detection_scale(gap); kroki 4–6 powtarzane są dla każdego rozmiaru
+    z config.close_kernel_sizes, a składowe znalezione ponownie są pomijane.
+    """
+    config = get_profile(config)
+
+    # Wczytanie obrazu
+    bgr = image
+    if bgr is None:
+        print("Błąd wczytania obrazu.")
+        return []
+
+    # Konwersja do skali szarości
+    rects = _note_rects(to_gray(bgr), gap, config, debug=debug)
+
+    music_symbols = []
 
+    for x_start, y_start, x_end, y_end in rects.tolist():
         # Wycinamy fragment obrazu odpowiadający nucie
         note_image = bgr[y_start:y_end, x_start:x_end]
         music_symbol = MusicSymbol(note_image, x_start)
         music_symbols.append(music_symbol)
 
-        cv2.rectangle(overlay, (x_start, y_start), (x_end, y_end), (0, 0, 255), 2)
-
     if debug:
+        # Kopia z obrysami tylko w trybie debug
+        overlay = to_bgr(bgr)
+        for x_start, y_start, x_end, y_end in rects.tolist():
+            cv2.rectangle(overlay, (x_start, y_start), (x_end, y_end), (0, 0, 255), 2)
         plt.figure(figsize=(12, 6))
-        plt.imshow(cv2.cvtColor(overlay, cv2.COLOR_BGR2RGB))
+        plt.imshow(to_rgb(overlay))
         plt.title("Wykryte nuty (obrysowane)")
         plt.axis('off')
         plt.show()
 
-    music_symbols.sort(key=lambda ms: ms.x) # sortowanie
     return music_symbols
 
+
+def detect_symbols_batch(image, gap, size=None, config=None):
+    """
+    Wariant detect_symbols dla klasyfikatora: zamiast listy osobnych wycinków zwraca
+    SymbolBatch z jednym spakowanym paskiem w skali szarości (nakładające się okna
+    sąsiednich nut są scalane, więc każda kolumna pięciolinii kopiowana jest najwyżej raz)
+    oraz, jeśli podano size = (szerokość, wysokość), tensorem (N, wysokość, szerokość)
+    wszystkich okien przeskalowanych jednym wektorowym wywołaniem.
+    Konwersja do skali szarości wykonywana jest raz dla całej pięciolinii.
+    """
+    config = get_profile(config)
+
+    gray = to_gray(image)
+    rects = _note_rects(gray, gap, config)
+    spans, group = merge_windows(rects)
+
+    # Jeden odczyt kolumn wszystkich scalonych przedziałów (tylko wiersze objęte oknami)
+    y_end = gray.shape[0] - 1
+    span_widths = spans[:, 1] - spans[:, 0]
+    if len(spans):
+        columns = np.concatenate([np.arange(x0, x1) for x0, x1 in spans])
+    else:
+        columns = np.zeros(0, dtype=np.intp)
+    strip = gray[:y_end, columns]
+
+    # Pozycja każdego okna w pasku: początek jego przedziału w pasku + przesunięcie w przedziale
+    span_offsets = np.concatenate([[0], np.cumsum(span_widths)[:-1]]).astype(np.int32)
+    offsets = span_offsets[group] + (rects[:, 0] - spans[group, 0])
+
+    tensor = resize_windows(gray, rects, size) if size is not None else None
+    return SymbolBatch(strip, rects, offsets.astype(np.int32), tensor)
+
+
 def display_notes(notes):
     """
     Funkcja do prezentacji wykrytych nut. Dostaje listę obiektów MusicSymbol
@@ -180,8 +337,8 @@ def display_notes(notes):
 
     plt.figure(figsize=(num_notes * 3, 4))
     for idx, note in enumerate(notes):
-        # Zakładamy, że obiekt MusicSymbol ma atrybut image zawierający obrazek w formacie BGR
-        image_rgb = cv2.cvtColor(note.image, cv2.COLOR_BGR2RGB)
+        # Obiekt MusicSymbol ma atrybut image zawierający obrazek w formacie BGR lub w skali szarości
+        image_rgb = to_rgb(note.image)
         plt.subplot(1, num_notes, idx + 1)
         plt.imshow(image_rgb)
         plt.title(f'Nuta nr {idx}')
@@ -193,7 +350,7 @@ def display_notes(notes):
 
 # === DEBUG STARTER ===
 if __name__ == '__main__':
-    staff_image = cv2.imread('output/output_staff_3.png')
+    staff_image = load_image('output/output_staff_3.png', grayscale=True)
     if staff_image is None:
         print("Błąd: Nie udało się wczytać obrazu.")
     else:
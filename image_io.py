@@ -0,0 +1,206 @@
+# image_io.py
+import os
+import struct
+
+import cv2
+import numpy as np
+
+
+# Tagi TIFF potrzebne do rozpoznania nieskompresowanego, ciągłego obrazu
+_TIFF_WIDTH = 256
+_TIFF_HEIGHT = 257
+_TIFF_BITS_PER_SAMPLE = 258
+_TIFF_COMPRESSION = 259
+_TIFF_PHOTOMETRIC = 262
+_TIFF_STRIP_OFFSETS = 273
+_TIFF_SAMPLES_PER_PIXEL = 277
+_TIFF_STRIP_BYTE_COUNTS = 279
+_TIFF_PLANAR_CONFIG = 284
+_TIFF_TILE_WIDTH = 322
+
+_TIFF_TYPE_SIZES = {1: ('B', 1), 3: ('H', 2), 4: ('I', 4)}
+
+
+def to_gray(image):
+    """
+    Zwraca obraz w skali szarości. Obrazy już jednokanałowe zwracane są bez kopiowania.
+    """
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def to_rgb(image):
+    """
+    Konwersja do RGB na potrzeby wyświetlania (matplotlib) – działa dla obrazów BGR i szarych.
+    """
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def to_bgr(image):
+    """
+    Trzykanałowa kopia obrazu do rysowania kolorowych obrysów (tryb debug).
+    Obrazy szare są rozszerzane do BGR – inaczej kolory rysowane byłyby tylko pierwszą składową.
+    """
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image.copy()
+
+
+def _read_pnm_header(f):
+    """
+    Czyta nagłówek binarnego PGM (P5) / PPM (P6).
+    Zwraca (kanały, szerokość, wysokość, maxval, offset danych) lub None.
+    """
+    magic = f.read(2)
+    if magic not in (b'P5', b'P6'):
+        return None
+
+    fields = []
+    token = b''
+    while len(fields) < 3:
+        c = f.read(1)
+        if not c:
+            return None
+        if c == b'#':
+            # Komentarz do końca linii
+            while c not in (b'\n', b'\r', b''):
+                c = f.read(1)
+            continue
+        if c.isspace():
+            if token:
+                fields.append(int(token))
+                token = b''
+            continue
+        token += c
+
+    # Po maxval występuje dokładnie jeden biały znak, a potem dane
+    width, height, maxval = fields
+    channels = 1 if magic == b'P5' else 3
+    return channels, width, height, maxval, f.tell()
+
+
+def _read_tiff_layout(f):
+    """
+    Sprawdza, czy TIFF jest nieskompresowany, 8-bitowy, z ciągłymi paskami (bez kafli).
+    Zwraca (kanały, szerokość, wysokość, offset danych) lub None, jeśli pliku nie da się zmapować.
+    """
+    order = f.read(2)
+    if order == b'II':
+        endian = '<'
+    elif order == b'MM':
+        endian = '>'
+    else:
+        return None
+
+    magic, ifd_offset = struct.unpack(endian + 'HI', f.read(6))
+    if magic != 42:
+        return None
+
+    f.seek(ifd_offset)
+    (num_entries,) = struct.unpack(endian + 'H', f.read(2))
+    tags = {}
+    for _ in range(num_entries):
+        tag, typ, count, raw = struct.unpack(endian + 'HHI4s', f.read(12))
+        if typ not in _TIFF_TYPE_SIZES:
+            continue
+        fmt, size = _TIFF_TYPE_SIZES[typ]
+        if count * size <= 4:
+            values = struct.unpack(endian + fmt * count, raw[:count * size])
+        else:
+            (offset,) = struct.unpack(endian + 'I', raw)
+            pos = f.tell()
+            f.seek(offset)
+            values = struct.unpack(endian + fmt * count, f.read(count * size))
+            f.seek(pos)
+        tags[tag] = values
+
+    if _TIFF_TILE_WIDTH in tags or _TIFF_STRIP_OFFSETS not in tags:
+        return None
+    if tags.get(_TIFF_COMPRESSION, (1,))[0] != 1 or tags.get(_TIFF_PLANAR_CONFIG, (1,))[0] != 1:
+        return None
+
+    channels = tags.get(_TIFF_SAMPLES_PER_PIXEL, (1,))[0]
+    photometric = tags.get(_TIFF_PHOTOMETRIC, (None,))[0]
+    if (channels, photometric) not in ((1, 1), (3, 2)):
+        return None
+    if any(bits != 8 for bits in tags.get(_TIFF_BITS_PER_SAMPLE, (1,))):
+        return None
+
+    width = tags[_TIFF_WIDTH][0]
+    height = tags[_TIFF_HEIGHT][0]
+    offsets = tags[_TIFF_STRIP_OFFSETS]
+    counts = tags.get(_TIFF_STRIP_BYTE_COUNTS)
+    if counts is None or len(counts) != len(offsets):
+        return None
+
+    # Paski muszą leżeć w pliku jeden za drugim, żeby dało się je zmapować jako jedną tablicę
+    for i in range(len(offsets) - 1):
+        if offsets[i] + counts[i] != offsets[i + 1]:
+            return None
+    if sum(counts) < width * height * channels:
+        return None
+
+    return channels, width, height, offsets[0]
+
+
+def _map_pixels(file_path, width, height, channels, offset):
+    """
+    Mapuje 8-bitowe piksele zaczynające się od offset (układ odczytany z nagłówka pliku).
+    """
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    return np.memmap(file_path, dtype=np.uint8, mode='r', offset=offset, shape=shape)
+
+
+def map_image(file_path):
+    """
+    Próbuje zmapować piksele pliku PGM/PPM lub nieskompresowanego TIFF-a bez dekodowania.
+    Zwraca (tablica np.memmap, kanały) – kanały RGB są w kolejności pliku (RGB) –
+    albo None, jeśli format nie nadaje się do mapowania.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    with open(file_path, 'rb') as f:
+        if ext in ('.pgm', '.ppm', '.pnm'):
+            header = _read_pnm_header(f)
+            if header is None:
+                return None
+            channels, width, height, maxval, offset = header
+            if maxval > 255:
+                return None
+        elif ext in ('.tif', '.tiff'):
+            layout = _read_tiff_layout(f)
+            if layout is None:
+                return None
+            channels, width, height, offset = layout
+        else:
+            return None
+
+    return _map_pixels(file_path, width, height, channels, offset), channels
+
+
+def load_image(file_path, grayscale=False):
+    """
+    Wczytuje obraz do przetwarzania.
+
+    Dla nieskompresowanych TIFF/PGM/PPM piksele nie są dekodowane do nowej tablicy,
+    tylko mapowane z pliku (np.memmap) – przy grayscale=True i obrazie szarym zwracana
+    jest wprost zmapowana tablica (tylko do odczytu), a przy obrazie kolorowym jedyną
+    alokacją jest wynik konwersji. Pozostałe formaty wczytywane są przez cv2.imread.
+    Zwraca None, jeśli obrazu nie udało się wczytać.
+    """
+    mapped = None
+    try:
+        mapped = map_image(file_path)
+    except (OSError, ValueError, struct.error):
+        mapped = None
+
+    if mapped is None:
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        return cv2.imread(file_path, flags)
+
+    pixels, channels = mapped
+    if channels == 1:
+        return pixels if grayscale else cv2.cvtColor(pixels, cv2.COLOR_GRAY2BGR)
+    return cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY if grayscale else cv2.COLOR_RGB2BGR)
@@ -3,10 +3,10 @@ import numpy as np
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import pyqtSignal
 
+from image_io import load_image
 from image_scene import ImageScene
 from image_viewer import ImageViewer
 from signals import SignalEmitter
-import cv2
 
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
@@ -39,14 +39,15 @@ class MainWindow(QtWidgets.QMainWindow):
         options = QtWidgets.QFileDialog.Options()
         file_path, _ = QtWidgets.QFileDialog.getOpenFileName(
             self, "Wczytaj obrazek", "",
-            "Pliki obrazów (*.png *.jpg *.bmp *.jpeg);;Wszystkie pliki (*.*)",
+            "Pliki obrazów (*.png *.jpg *.bmp *.jpeg *.tif *.tiff *.pgm *.ppm);;Wszystkie pliki (*.*)",
             options=options)
         if file_path:
             self.loadImage(file_path)
 
     def loadImage(self, file_path):
         pixmap = QtGui.QPixmap(file_path)
-        self.image = cv2.imread(file_path)
+        # Potok nie potrzebuje koloru – obraz w skali szarości (dla TIFF/PGM mapowany z pliku)
+        self.image = load_image(file_path, grayscale=True)
         if pixmap.isNull():
             QtWidgets.QMessageBox.critical(self, "⚠️ Błąd", "Nie udało się wczytać obrazka!")
             return
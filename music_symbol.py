@@ -3,4 +3,28 @@
 class MusicSymbol:
     def __init__(self, image, x):
         self.image = image
-        self.x = x
\ No newline at end of file
+        self.x = x
+
+
+class SymbolBatch:
+    """
+    Wszystkie wykryte nuty jednej pięciolinii w postaci gotowej dla klasyfikatora:
+      - strip: spakowany pasek w skali szarości (scalone okna nut, kolumny obok siebie),
+      - rects: tablica (N, 4) okien [x_start, y_start, x_end, y_end] we współrzędnych pięciolinii,
+      - offsets: (N,) początek okna i w pasku (szerokość okna to x_end - x_start),
+      - tensor: (N, wysokość, szerokość) okna przeskalowane do stałego rozmiaru albo None.
+    """
+    def __init__(self, strip, rects, offsets, tensor=None):
+        self.strip = strip
+        self.rects = rects
+        self.offsets = offsets
+        self.tensor = tensor
+
+    def __len__(self):
+        return len(self.rects)
+
+    def window(self, i):
+        # Widok (bez kopiowania) na okno i-tej nuty w pasku
+        x_start, _, x_end, _ = self.rects[i]
+        offset = self.offsets[i]
+        return self.strip[:, offset:offset + x_end - x_start]
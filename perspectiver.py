@@ -32,6 +32,14 @@ def perspective_with_scaling(image, pts_src, max_width=1000, max_height=500):
         [width_target - 1, height_target - 1]
     ])
 
+    # Punkty w rogach całego obrazu (domyślne, gdy nic nie zaznaczono) – nie ma czego
+    # prostować, więc zamiast alokować pełnowymiarową kopię zwracamy obraz wejściowy
+    # (np. zmapowany z pliku)
+    h, w = image.shape[:2]
+    image_corners = np.float32([[0, 0], [w - 1, 0], [0, h - 1], [w - 1, h - 1]])
+    if np.allclose(pts_src, image_corners):
+        return image
+
     M = cv2.getPerspectiveTransform(pts_src, pts_dst)
     warped = cv2.warpPerspective(image, M, (width_target, height_target))
 
@@ -0,0 +1,89 @@
+# pipeline_config.py
+
+
+class PipelineConfig:
+    """
+    Wszystkie progi i rozmiary jąder używane przez stave_separator i box_notes w jednym miejscu.
+    Domyślne wartości odpowiadają profilowi "balanced" (dotychczasowe, zaszyte w kodzie wartości).
+    """
+    def __init__(self, name="balanced",
+                 scale=1.0, min_line_spacing=12, min_scale_size=1500,
+                 line_kernel_divisor=15, line_kernel_min=30, line_close_iterations=2,
+                 max_angle=5, line_aspect_min=30, line_height_limit=30, reference_height=2219,
+                 cluster_gap_factor=1.5, group_tolerance_factor=0.5, staff_margin=3,
+                 line_length_ratio=0.3, close_kernel_sizes=(7,), open_kernel_size=3,
+                 min_area_ratio=0.0003, circularity_low=0.4, circularity_high=1.2,
+                 aspect_low=0.5, aspect_high=1.3, note_margin_ratio=0.3):
+        self.name = name
+        # Najmniejsza skala, w jakiej wykonywana jest detekcja (wycinki zawsze są z obrazu
+        # w pełnej rozdzielczości) – patrz detection_scale
+        self.scale = scale
+        self.min_line_spacing = min_line_spacing  # odstęp między liniami [px] po przeskalowaniu
+        self.min_scale_size = min_scale_size  # mniejszych obrazów (dłuższy bok [px]) nie skalujemy
+
+        # stave_separator – wykrywanie linii
+        self.line_kernel_divisor = line_kernel_divisor
+        self.line_kernel_min = line_kernel_min
+        self.line_close_iterations = line_close_iterations
+        self.max_angle = max_angle
+        self.line_aspect_min = line_aspect_min
+        self.line_height_limit = line_height_limit  # w pikselach dla obrazu o wysokości reference_height
+        self.reference_height = reference_height
+
+        # stave_separator – grupowanie i wycinanie pięciolinii
+        self.cluster_gap_factor = cluster_gap_factor
+        self.group_tolerance_factor = group_tolerance_factor
+        self.staff_margin = staff_margin  # margines wycinka w odstępach między liniami
+
+        # box_notes – czyszczenie i filtracja symboli
+        self.line_length_ratio = line_length_ratio
+        self.close_kernel_sizes = tuple(close_kernel_sizes)  # każdy rozmiar to osobny przebieg detekcji
+        self.open_kernel_size = open_kernel_size  # 0 wyłącza otwarcie
+        self.min_area_ratio = min_area_ratio
+        self.circularity_low = circularity_low
+        self.circularity_high = circularity_high
+        self.aspect_low = aspect_low
+        self.aspect_high = aspect_high
+        self.note_margin_ratio = note_margin_ratio
+
+    def detection_scale(self, line_spacing, shape):
+        """
+        Skala detekcji dla obrazu o danym odstępie między liniami pięciolinii i rozmiarze.
+        Obraz pomniejszamy co najwyżej do self.scale i tylko na tyle, żeby odstęp między
+        liniami wynosił nadal co najmniej min_line_spacing pikseli – inaczej sąsiednie
+        linie zlewają się i pięciolinie giną. Obrazów o dłuższym boku poniżej min_scale_size
+        nie skalujemy wcale (zysk czasu jest znikomy, a detekcja na nich jest najmniej stabilna).
+        """
+        if self.scale >= 1.0 or line_spacing <= 0 or max(shape[:2]) < self.min_scale_size:
+            return 1.0
+        return min(1.0, max(self.scale, self.min_line_spacing / line_spacing))
+
+    def __repr__(self):
+        return f"PipelineConfig({self.name!r})"
+
+
+PROFILES = {
+    # Detekcja w maks. połowie rozdzielczości (dla dużych obrazów, o ile odstęp linii pozostaje
+    # >= 12 px, jądra morfologiczne zmniejszane w tej samej skali) i jedno domknięcie linii
+    "fast": PipelineConfig("fast", scale=0.5, line_close_iterations=1),
+    "balanced": PipelineConfig("balanced"),
+    # Dodatkowe domknięcie linii i trzy przebiegi detekcji symboli z różnymi jądrami
+    "accurate": PipelineConfig("accurate", line_close_iterations=3,
+                               close_kernel_sizes=(7, 5, 9)),
+}
+
+DEFAULT_PROFILE = "balanced"
+
+
+def get_profile(profile=None):
+    """
+    Zwraca konfigurację dla nazwy profilu ("fast", "balanced", "accurate").
+    Przyjmuje też gotowy obiekt PipelineConfig; None oznacza profil domyślny.
+    """
+    if profile is None:
+        return PROFILES[DEFAULT_PROFILE]
+    if isinstance(profile, PipelineConfig):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Nieznany profil: {profile!r} (dostępne: {', '.join(PROFILES)})")
+    return PROFILES[profile]
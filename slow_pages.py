@@ -0,0 +1,278 @@
+# slow_pages.py
+import cProfile
+import collections
+import io
+import json
+import os
+import pstats
+import re
+import shutil
+import sys
+import threading
+import time
+import traceback
+
+import cv2
+import numpy as np
+
+
+class StackSampler:
+    """
+    Lekki próbnik stosu: wątek co interval sekund odczytuje stos wątku roboczego
+    (sys._current_frames) i zlicza powtarzające się ścieżki wywołań.
+    Dużo tańszy niż cProfile, więc może działać przy każdej stronie.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            self.samples[';'.join(f"{s.name} ({os.path.basename(s.filename)}:{s.lineno})" for s in stack)] += 1
+
+    def report(self):
+        # Format "collapsed stacks" (jak dla flamegraph.pl): ścieżka;wywołań liczba_próbek
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class Stage:
+    """
+    Pomiar pojedynczego etapu przetwarzania strony: czas, licznik (np. liczba konturów)
+    oraz bufory pośrednie dołączane do ewentualnego zrzutu.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+        self.counts = {}
+        self.buffers = {}
+
+    def count(self, name, value):
+        self.counts[name] = int(value)
+
+    def attach(self, **buffers):
+        # Tylko referencje – nic nie jest kopiowane, dopóki strona nie okaże się patologiczna
+        self.buffers.update(buffers)
+
+
+class _NullStage:
+    def count(self, name, value):
+        pass
+
+    def attach(self, **buffers):
+        pass
+
+
+class SlowPageRecorder:
+    """
+    Opcjonalny rejestrator patologicznych stron.
+
+    Każdy etap (stage) ma budżet czasu (time_budgets / time_budget, w sekundach) i budżety
+    liczników (count_budgets: {(etap, licznik): maksimum}). Jeśli którykolwiek zostanie
+    przekroczony, po zakończeniu strony do spill_dir zapisywany jest katalog z obrazem
+    wejściowym, buforami pośrednimi (maski jako PNG, listy kandydatów jako JSON),
+    czasami i licznikami etapów (oraz opisem z describe – profilem i skalą detekcji) i profilem
+    wykonania (próbki stosu lub cProfile przy use_cprofile=True).
+    W spill_dir trzymanych jest najwyżej max_pages ostatnich zrzutów.
+    """
+    def __init__(self, spill_dir, time_budget=None, time_budgets=None, count_budgets=None,
+                 max_pages=20, use_cprofile=False, sample_interval=0.005):
+        self.spill_dir = spill_dir
+        self.time_budget = time_budget
+        self.time_budgets = time_budgets or {}
+        self.count_budgets = count_budgets or {}
+        self.max_pages = max_pages
+        self.use_cprofile = use_cprofile
+        self.sample_interval = sample_interval
+
+        self._page = None
+
+    def page(self, image, name="page"):
+        return _PageContext(self, image, name)
+
+    def stage(self, name):
+        return _StageContext(self, name)
+
+    def describe(self, **info):
+        """
+        Dołącza do bieżącej strony opis przebiegu (np. profil i skalę detekcji) zapisywany w summary.json.
+        """
+        if self._page is not None:
+            self._page.info.update(info)
+
+    def over_budget(self, stage):
+        """
+        Zwraca listę opisów przekroczonych budżetów dla etapu.
+        """
+        reasons = []
+        budget = self.time_budgets.get(stage.name, self.time_budget)
+        if budget is not None and stage.elapsed > budget:
+            reasons.append(f"{stage.name}: czas {stage.elapsed:.3f} s > {budget} s")
+        for counter, value in stage.counts.items():
+            limit = self.count_budgets.get((stage.name, counter))
+            if limit is not None and value > limit:
+                reasons.append(f"{stage.name}: {counter} {value} > {limit}")
+        return reasons
+
+    def spill(self, page):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        # Nazwa strony to zwykle ścieżka skanu – w nazwie katalogu zostaje tylko nazwa pliku
+        label = re.sub(r'[^\w.-]+', '_', os.path.basename(page.name)) or 'page'
+        page_dir = os.path.join(self.spill_dir, f"{stamp}_{label}_{os.getpid()}_{page.serial}")
+        os.makedirs(page_dir, exist_ok=True)
+
+        cv2.imwrite(os.path.join(page_dir, 'input.png'), page.image)
+
+        summary = {'page': page.name, **page.info, 'reasons': page.reasons, 'stages': []}
+        for stage in page.stages:
+            summary['stages'].append({'name': stage.name, 'elapsed': stage.elapsed, 'counts': stage.counts})
+            for key, buffer in stage.buffers.items():
+                base = os.path.join(page_dir, f"{stage.name}_{key}")
+                if isinstance(buffer, np.ndarray):
+                    cv2.imwrite(base + '.png', buffer)
+                else:
+                    with open(base + '.json', 'w', encoding='utf-8') as f:
+                        json.dump(buffer, f, default=_to_json)
+
+        with open(os.path.join(page_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=1, ensure_ascii=False)
+
+        if page.profiler is not None:
+            page.profiler.dump_stats(os.path.join(page_dir, 'profile.prof'))
+            text = io.StringIO()
+            pstats.Stats(page.profiler, stream=text).sort_stats('cumulative').print_stats(40)
+            with open(os.path.join(page_dir, 'profile.txt'), 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+        if page.sampler is not None:
+            with open(os.path.join(page_dir, 'stacks.txt'), 'w', encoding='utf-8') as f:
+                f.write(page.sampler.report())
+
+        self._trim()
+        print(f"Zapisano patologiczną stronę do {page_dir}: {'; '.join(page.reasons)}")
+        return page_dir
+
+    def _trim(self):
+        # Ograniczenie rozmiaru katalogu – usuwamy najstarsze zrzuty
+        entries = [os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir)]
+        entries = sorted((e for e in entries if os.path.isdir(e)), key=os.path.getmtime)
+        for old in entries[:max(0, len(entries) - self.max_pages)]:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Nie można zapisać {type(value).__name__} do JSON")
+
+
+class _Page:
+    _serial = 0
+
+    def __init__(self, image, name):
+        _Page._serial += 1
+        self.serial = _Page._serial
+        self.image = image
+        self.name = name
+        self.info = {}
+        self.stages = []
+        self.reasons = []
+        self.profiler = None
+        self.sampler = None
+
+
+class _PageContext:
+    def __init__(self, recorder, image, name):
+        self.recorder = recorder
+        self.page = _Page(image, name)
+
+    def __enter__(self):
+        recorder = self.recorder
+        recorder._page = self.page
+        if recorder.use_cprofile:
+            self.page.profiler = cProfile.Profile()
+            self.page.profiler.enable()
+        else:
+            self.page.sampler = StackSampler(recorder.sample_interval)
+            self.page.sampler.start()
+        return self.page
+
+    def __exit__(self, exc_type, exc, tb):
+        recorder = self.recorder
+        page = self.page
+        if page.profiler is not None:
+            page.profiler.disable()
+        if page.sampler is not None:
+            page.sampler.stop()
+        recorder._page = None
+
+        for stage in page.stages:
+            page.reasons.extend(recorder.over_budget(stage))
+        if page.reasons:
+            recorder.spill(page)
+        return False
+
+
+class _StageContext:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.stage = Stage(name)
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self.stage
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stage.elapsed = time.perf_counter() - self._start
+        if self.recorder._page is not None:
+            self.recorder._page.stages.append(self.stage)
+        return False
+
+
+class _NullContext:
+    def __init__(self, value):
+        self.value = value
+
+    def __enter__(self):
+        return self.value
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class NullRecorder:
+    """
+    Rejestrator, który nic nie robi – używany, gdy nagrywanie wolnych stron jest wyłączone.
+    """
+    def page(self, image, name="page"):
+        return _NullContext(None)
+
+    def stage(self, name):
+        return _NullContext(_NullStage())
+
+    def describe(self, **info):
+        pass
+
+
+NULL_RECORDER = NullRecorder()
@@ -5,38 +5,46 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+from image_io import load_image, to_bgr, to_gray, to_rgb
+from pipeline_config import get_profile
+from slow_pages import NULL_RECORDER
 
-def get_image_details(image):
+
+def get_image_details(image, kernel_divisor=15, kernel_min=30, close_iterations=2):
     """
     Konwertuje obraz do skali szarości, binaryzuje oraz wykorzystuje operacje morfologiczne
     z poziomym jądrem, aby wydobyć poziome linie.
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(image)
     # Binaryzacja Otsu – linie białe na czarnym tle (odwrócony obraz)
     _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
 
     # Dostosowanie jądra – wybieramy jądro o szerokości zależnej od szerokości obrazu
-    kernel_width = max(30, image.shape[1] // 15)
+    kernel_width = max(kernel_min, image.shape[1] // kernel_divisor)
     horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 1))
 
     # Operacja morfologiczna typu opening, która usuwa szumy i pozostawia głównie poziome linie
     detected_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=1)
 
     # Operacja closing – połączenie przerw w wykrytych liniach
-    closed_lines = cv2.morphologyEx(detected_lines, cv2.MORPH_CLOSE, horizontal_kernel, iterations=2)
+    closed_lines = cv2.morphologyEx(detected_lines, cv2.MORPH_CLOSE, horizontal_kernel, iterations=close_iterations)
 
     return binary, closed_lines
 
 
-def find_lines(detected_lines, image, max_angle=5):
+def find_lines(detected_lines, image, max_angle=5, aspect_min=30, height_limit=30, reference_height=2219, stage=None):
     """
     Wyszukuje kontury w obrazie po operacjach morfologicznych oraz filtruje te,
     które są wystarczająco długie (min_width_ratio * szerokość obrazu), mają mały kąt (max_angle)
-    oraz niewielką wysokość (skalowaną w zależności od rozmiaru obrazu).
+    oraz niewielką wysokość (height_limit dla obrazu o wysokości reference_height,
+    skalowaną w zależności od rozmiaru obrazu).
 
     Zwraca listę krotek: (x, y, w, h, y_center)
+    Opcjonalny stage (slow_pages.Stage) dostaje liczbę znalezionych konturów.
     """
     contours, _ = cv2.findContours(detected_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if stage is not None:
+        stage.count('contours', len(contours))
     candidates = []
     for cnt in contours:
         # Uzyskujemy minimalny prostokąt otaczający
@@ -50,7 +58,7 @@ def find_lines(detected_lines, image, max_angle=5):
             w, h = h, w  # zamiana, jeśli potrzebna
 
         # Kryteria poprawnej linii
-        if (h < 1 or w / h > 30) and (angle % 180 < max_angle or angle % 180 > 180 - max_angle) and (h < 30 * (image.shape[0] / 2219)):
+        if (h < 1 or w / h > aspect_min) and (angle % 180 < max_angle or angle % 180 > 180 - max_angle) and (h < height_limit * (image.shape[0] / reference_height)):
             # Obliczenie lewego górnego rogu
             x = int(cx - w / 2)
             y = int(cy - h / 2)
@@ -61,7 +69,7 @@ def find_lines(detected_lines, image, max_angle=5):
     return candidates
 
 
-def group_staffs(candidates):
+def group_staffs(candidates, cluster_gap_factor=1.5, group_tolerance_factor=0.5, stage=None):
     """
     Grupuje kandydatów (wykryte linie) w pięciolinie muzyczne przy użyciu dynamicznie ustalanych progów,
     dzięki czemu funkcja jest mniej zależna od rozmiaru obrazka.
@@ -71,15 +79,17 @@ def group_staffs(candidates):
       2. Obliczamy różnice między kolejnymi wartościami y (centers) i wyznaczamy medianę tych różnic.
          Ta mediana przyjmowana jest jako "typowa" odległość między liniami w obrębie jednej pięciolinii.
       3. Dynamiczny próg oddzielenia pięciolinii (cluster_gap_thresh) ustalamy jako:
-             cluster_gap_thresh = median_diff * 1.5
+             cluster_gap_thresh = median_diff * cluster_gap_factor
          – dzięki temu większe przerwy między klastrami (czyli między pięcioliniami) są wyłapywane.
       4. Tolerancję grupowania linii w obrębie jednej pięciolinii (group_tolerance) ustalamy jako:
-             group_tolerance = median_diff * 0.5
+             group_tolerance = median_diff * group_tolerance_factor
          – mała zmienność odstępów między liniami w obrębie tego samego pięciolinii.
       5. Najpierw kandydaci są dzieleni na klastery, jeśli odstęp między kolejnymi liniami przekracza cluster_gap_thresh.
       6. Następnie w obrębie każdej grupy przeszukiwane są okna pięciu kolejnych linii.
          Jeśli różnica między największą a najmniejszą wartością odstępów (między środkami linii) nie przekracza group_tolerance,
          przyjmujemy to jako poprawnie wyodrębnioną pięciolinię.
+
+    Opcjonalny stage (slow_pages.Stage) dostaje liczbę klastrów i rozmiar największego z nich.
     """
     # Sortowanie kandydatów według współrzędnej y środka (cy) – przyjmujemy, że znajduje się on na pozycji indeksu 4
     sorted_candidates = sorted(candidates, key=lambda c: c[4])
@@ -94,8 +104,8 @@ def group_staffs(candidates):
     median_diff = np.median(diffs)
 
     # Dynamicznie ustalane progi (można zmieniać mnożniki w zależności od specyfiki obrazka)
-    cluster_gap_thresh = median_diff * 1.5
-    group_tolerance = median_diff * 0.5
+    cluster_gap_thresh = median_diff * cluster_gap_factor
+    group_tolerance = median_diff * group_tolerance_factor
 
     # Etap 1: Klasteryzacja – grupowanie kandydatów, gdy różnica między środkami jest mniejsza niż cluster_gap_thresh
     clusters = []
@@ -112,6 +122,9 @@ def group_staffs(candidates):
                 current_cluster = [cand]
     if current_cluster:
         clusters.append(current_cluster)
+    if stage is not None:
+        stage.count('clusters', len(clusters))
+        stage.count('largest_cluster', max(len(cluster) for cluster in clusters))
 
     # Etap 2: W obrębie każdego klastra szukamy okien 5 kolejnych linii spełniających warunek spójności
     groups = []
@@ -140,9 +153,9 @@ def group_staffs(candidates):
     return final_groups
 
 
-def extract_staffs(image, groups):
+def extract_staffs(image, groups, margin=3):
     """
-    Dla każdej grupy (pięciolini) określa pionowy obszar obejmujący staff (z dolanym marginesem)
+    Dla każdej grupy (pięciolini) określa pionowy obszar obejmujący staff (z dodanym marginesem margin * odstęp między liniami)
     i wycina go z całego obrazu.
     """
     regions = []
@@ -151,8 +164,8 @@ def extract_staffs(image, groups):
         diff = abs(group[0][4] - group[1][4])
         gaps.append(diff)
 
-        top = int(min(item[1] for item in group)) - 3*diff
-        bottom = int(max(item[1] + item[3] for item in group)) + 3*diff
+        top = int(min(item[1] for item in group)) - margin*diff
+        bottom = int(max(item[1] + item[3] for item in group)) + margin*diff
 
         top = max(top, 0)
         bottom = min(bottom, image.shape[0]-1)
@@ -162,25 +175,103 @@ def extract_staffs(image, groups):
     return regions, gaps
 
 
-def process_image(image, debug=False):
+def estimate_line_spacing(image, columns=64):
+    """
+    Szybkie oszacowanie odstępu między liniami pięciolinii (bez wykrywania linii):
+    w około `columns` kolumnach obrazu mierzymy długości pionowych serii pikseli.
+    Najczęstsza seria czarna to grubość linii, najczęstsza seria biała to odstęp
+    między liniami – ich suma to odległość środków sąsiednich linii.
+    Zwraca 0, jeśli nie da się jej oszacować.
+    """
+    gray = to_gray(image)
+    step = max(1, gray.shape[1] // columns)
+    sample = np.ascontiguousarray(gray[:, ::step])
+    _, binary = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    # Początki i końce serii czarnych pikseli w każdej kolumnie
+    runs = np.pad(binary.T > 0, ((0, 0), (1, 1))).astype(np.int8)
+    edges = np.diff(runs, axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    if len(starts) < 2:
+        return 0
+
+    black = ends[:, 1] - starts[:, 1]
+    same_column = starts[1:, 0] == ends[:-1, 0]
+    white = (starts[1:, 1] - ends[:-1, 1])[same_column]
+    if len(white) == 0:
+        return 0
+    return int(np.bincount(black).argmax() + np.bincount(white).argmax())
+
+
+def scale_candidates(candidates, factor):
+    """
+    Przelicza kandydatów (x, y, w, h, y_center) wykrytych na przeskalowanym obrazie
+    z powrotem do współrzędnych obrazu w pełnej rozdzielczości.
+    """
+    return [tuple(int(round(v / factor)) for v in cand) for cand in candidates]
+
+
+def process_image(image, debug=False, config=None, recorder=None, name="page"):
+    """
+    Wykrywa pięciolinie i wycina je z obrazu. config to profil ("fast", "balanced",
+    "accurate") lub obiekt PipelineConfig; przy config.scale < 1 linie wykrywane są na
+    obrazie pomniejszonym według config.detection_scale (na podstawie oszacowanego odstępu
+    między liniami), a wycinki pochodzą z obrazu w pełnej rozdzielczości.
+    recorder (slow_pages.SlowPageRecorder) mierzy etapy i zapisuje strony przekraczające budżet;
+    name (np. ścieżka skanu) trafia do nazwy zrzutu i jego summary.json.
+    """
+    recorder = recorder or NULL_RECORDER
+    with recorder.page(image, name):
+        return _process_image(image, debug, get_profile(config), recorder)
+
+
+def _process_image(image, debug, config, recorder):
+
+    detection_image = image
+    scale = 1.0
+    if config.scale != 1.0:
+        scale = config.detection_scale(estimate_line_spacing(image), image.shape)
+    if scale != 1.0:
+        detection_image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    # Maski binary/closed_lines w zrzucie są w skali detekcji – zapisujemy ją razem z profilem
+    recorder.describe(profile=config.name, scale=scale)
+
     # 1. Detekcja linii i zwrócenie obrazów pośrednich
-    binary, detected_lines_cont = get_image_details(image)
+    with recorder.stage('get_image_details') as stage:
+        binary, detected_lines_cont = get_image_details(detection_image,
+                                                        kernel_divisor=config.line_kernel_divisor,
+                                                        kernel_min=config.line_kernel_min,
+                                                        close_iterations=config.line_close_iterations)
+        stage.attach(binary=binary, closed_lines=detected_lines_cont)
 
     # Wizualizacja etapów przetwarzania
     if debug:
         plt.figure(figsize=(15, 8))
-        plt.subplot(231), plt.imshow(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)), plt.title('Oryginał')
+        plt.subplot(231), plt.imshow(to_rgb(image)), plt.title('Oryginał')
         plt.subplot(232), plt.imshow(binary, cmap='gray'), plt.title('Binaryzacja Otsu (odwrócona)')
         plt.subplot(233), plt.imshow(detected_lines_cont, cmap='gray'), plt.title('Po operacjach morfologicznych')
 
     # 2. Znalezienie kandydatów
-    candidates = find_lines(detected_lines_cont, image)
-    img_candidates = image.copy()
-    for cand in candidates:
-        x, y, w, h, _ = cand
-        cv2.rectangle(img_candidates, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    with recorder.stage('find_lines') as stage:
+        candidates = find_lines(detected_lines_cont, detection_image,
+                                max_angle=config.max_angle,
+                                aspect_min=config.line_aspect_min,
+                                height_limit=config.line_height_limit,
+                                reference_height=config.reference_height,
+                                stage=stage)
+        stage.count('candidates', len(candidates))
+        # Kandydaci (jak i grupy) zapisywani są we współrzędnych obrazu w pełnej rozdzielczości
+        if scale != 1.0:
+            candidates = scale_candidates(candidates, scale)
+        stage.attach(candidates=candidates)
+    # Kopie obrazu z obrysami tylko w trybie debug – wejście może być dużym, zmapowanym skanem
     if debug:
-        plt.subplot(234), plt.imshow(cv2.cvtColor(img_candidates, cv2.COLOR_BGR2RGB)), plt.title(f'Kandydaci: {len(candidates)}')
+        img_candidates = to_bgr(image)
+        for cand in candidates:
+            x, y, w, h, _ = cand
+            cv2.rectangle(img_candidates, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        plt.subplot(234), plt.imshow(to_rgb(img_candidates)), plt.title(f'Kandydaci: {len(candidates)}')
 
     if not candidates:
         print("Nie wykryto żadnych poziomych linii")
@@ -188,16 +279,21 @@ def process_image(image, debug=False):
 
 
     # 3. Grupowanie kandydatów w staffy (pięciolinie)
-    groups = group_staffs(candidates)
-    img_groups = image.copy()
-    colors = plt.get_cmap('hsv', len(groups)+1)  # <--- TU BYŁ PROBLEM
-    for i, group in enumerate(groups):
-        color = [int(255*c) for c in colors(i)[:3]]
-        for cand in group:
-            x, y, w, h, _ = cand
-            cv2.rectangle(img_groups, (x,y), (x+w,y+h), color, 3)
+    with recorder.stage('group_staffs') as stage:
+        groups = group_staffs(candidates,
+                              cluster_gap_factor=config.cluster_gap_factor,
+                              group_tolerance_factor=config.group_tolerance_factor,
+                              stage=stage)
+        stage.attach(groups=groups)
     if debug:
-        plt.subplot(235), plt.imshow(cv2.cvtColor(img_groups, cv2.COLOR_BGR2RGB)), plt.title(f'Pogrupowane: {len(groups)}')
+        img_groups = to_bgr(image)
+        colors = plt.get_cmap('hsv', len(groups)+1)  # <--- TU BYŁ PROBLEM
+        for i, group in enumerate(groups):
+            color = [int(255*c) for c in colors(i)[:3]]
+            for cand in group:
+                x, y, w, h, _ = cand
+                cv2.rectangle(img_groups, (x,y), (x+w,y+h), color, 3)
+        plt.subplot(235), plt.imshow(to_rgb(img_groups)), plt.title(f'Pogrupowane: {len(groups)}')
         plt.tight_layout()
         plt.show()
 
@@ -207,7 +303,7 @@ def process_image(image, debug=False):
 
 
     # 4. Wycięcie regionów staffów
-    staffs, gaps = extract_staffs(image, groups)
+    staffs, gaps = extract_staffs(image, groups, margin=config.staff_margin)
 
     # # Utwórz folder output, jeśli nie istnieje
     # os.makedirs('output', exist_ok=True)
@@ -224,7 +320,7 @@ def process_image(image, debug=False):
         plt.figure(figsize=(12, 5 * rows))
         for i, region in enumerate(staffs, 1):
             plt.subplot(rows, cols, i)
-            plt.imshow(cv2.cvtColor(region, cv2.COLOR_BGR2RGB))
+            plt.imshow(to_rgb(region))
             plt.title(f"Pięciolinia {i}")
             plt.axis("off")
         plt.tight_layout()
@@ -235,7 +331,7 @@ def process_image(image, debug=False):
 
 if __name__ == '__main__':
     image_path = "data/wlazl_kotek_na_plotek.jpg"  # Podmień na ścieżkę do obrazu z nutami
-    image = cv2.imread(image_path)
+    image = load_image(image_path, grayscale=True)
     if image is None:
         sys.exit(1)
 
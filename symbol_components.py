@@ -0,0 +1,63 @@
+# symbol_components.py
+import math
+
+import cv2
+
+
+class SymbolComponent:
+    """
+    Statystyki pojedynczego obiektu (zewnętrznego konturu) z binarnego obrazu pięciolinii.
+    Liczone raz w find_components i współdzielone przez wszystkie klasyfikatory symboli.
+    """
+    def __init__(self, label, contour, x, y, w, h, rect_w, rect_h, area, perimeter):
+        self.label = label
+        self.contour = contour
+        # Bounding box (osiowy)
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        # Wymiary minimalnego obróconego prostokąta (cv2.minAreaRect)
+        self.rect_w = rect_w
+        self.rect_h = rect_h
+        # Pole zewnętrznego konturu – obejmuje wewnętrzne otwory (np. główki półnut)
+        self.area = area
+        self.perimeter = perimeter
+
+    @property
+    def aspect_ratio(self):
+        return self.rect_w / self.rect_h if self.rect_h != 0 else 0
+
+    @property
+    def fill_ratio(self):
+        # Stosunek pola konturu do pola bounding boxa (dla koła ~0.785)
+        bbox_area = self.w * self.h
+        return self.area / bbox_area if bbox_area != 0 else 0
+
+    @property
+    def circularity(self):
+        # 4*pi * (area) / (perimeter^2) – dla idealnego koła 1.0
+        if self.perimeter == 0:
+            return 0
+        return 4 * math.pi * self.area / (self.perimeter ** 2)
+
+
+def find_components(binary_image, min_area=0):
+    """
+    Jeden przebieg findContours (tylko zewnętrzne kształty) i jednorazowe policzenie
+    statystyk każdego konturu. Kontury o polu mniejszym niż min_area są odrzucane
+    przed liczeniem pozostałych statystyk.
+    """
+    contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    components = []
+    for label, cnt in enumerate(contours):
+        area = cv2.contourArea(cnt)
+        if area < min_area:
+            continue
+        x, y, w, h = cv2.boundingRect(cnt)
+        (_, _), (rect_w, rect_h), _ = cv2.minAreaRect(cnt)
+        perimeter = cv2.arcLength(cnt, True)
+        components.append(SymbolComponent(label, cnt, x, y, w, h, rect_w, rect_h, area, perimeter))
+
+    return components
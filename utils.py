@@ -2,9 +2,9 @@ import perspectiver as psp
 import stave_separator as ss
 import box_notes as bn
 
-def sheet_image_handler(sheet_image, persp_points_arr):
+def sheet_image_handler(sheet_image, persp_points_arr, profile=None):
     warped = psp.perspective_with_scaling(sheet_image, persp_points_arr) # zmiana perspektywy zdjęcia
-    staffs, gaps = ss.process_image(warped, debug=True) # wykrycie pięciolinii
+    staffs, gaps = ss.process_image(warped, debug=True, config=profile) # wykrycie pięciolinii
 
     if staffs is None:
         # TODO: print error
@@ -13,7 +13,7 @@ def sheet_image_handler(sheet_image, persp_points_arr):
     # Zebranie nut do tablicy [n][k], gdzię: n-ta pięciolinia wkolei (od góry licząc); k-ta nutka
     notes = []
     for staff, gap in zip(staffs, gaps):
-        staff_notes = bn.detect_symbols(staff, gap, debug=True)
+        staff_notes = bn.detect_symbols(staff, gap, debug=True, config=profile)
         notes.append(staff_notes)
         bn.display_notes(staff_notes) # odkomentować, żeby zobaczyć wycięte nutki
 
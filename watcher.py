@@ -0,0 +1,375 @@
+# watcher.py
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import matplotlib
+matplotlib.use('Agg')  # demon działa bez okien
+
+import cv2
+import numpy as np
+
+import box_notes as bn
+import perspectiver as psp
+import stave_separator as ss
+from image_io import load_image
+from pipeline_config import PROFILES, DEFAULT_PROFILE
+from slow_pages import SlowPageRecorder
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # brak inotify (inny system lub brak pakietu) – zostaje odpytywanie katalogu
+    INotify = None
+
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.pgm', '.ppm'}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    SHA-256 zawartości pliku – ten sam skan pod inną nazwą nie jest przetwarzany ponownie.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def process_scan(path, digest, output_dir, profile=DEFAULT_PROFILE, slow_pages=None):
+    """
+    Przepuszcza skan przez perspectiver -> stave_separator -> box_notes i zapisuje
+    wycięte pięciolinie i nuty do output_dir/<nazwa>_<skrót hasha>/.
+    Uruchamiane w procesie roboczym, dlatego zwraca tylko podsumowanie (słownik).
+    slow_pages to argumenty SlowPageRecorder (None wyłącza nagrywanie wolnych stron).
+    """
+    image = load_image(path, grayscale=True)
+    if image is None:
+        return {'path': path, 'error': "Nie udało się wczytać obrazu"}
+
+    # Skany są płaskie – tak jak w MainWindow bez zaznaczonych punktów bierzemy rogi całego obrazu
+    h, w = image.shape[:2]
+    corners = np.float32([[0, 0], [w - 1, 0], [0, h - 1], [w - 1, h - 1]])
+    warped = psp.perspective_with_scaling(image, corners)
+
+    recorder = SlowPageRecorder(**slow_pages) if slow_pages else None
+    result = ss.process_image(warped, config=profile, recorder=recorder, name=path)
+    if result is None:
+        return {'path': path, 'error': "Nie znaleziono pięciolinii"}
+    staffs, gaps = result
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    scan_dir = os.path.join(output_dir, f"{stem}_{digest[:12]}")
+    os.makedirs(scan_dir, exist_ok=True)
+
+    symbols = 0
+    for i, (staff, gap) in enumerate(zip(staffs, gaps), 1):
+        cv2.imwrite(os.path.join(scan_dir, f"staff_{i}.png"), staff)
+        for j, note in enumerate(bn.detect_symbols(staff, gap, config=profile), 1):
+            cv2.imwrite(os.path.join(scan_dir, f"staff_{i}_note_{j}.png"), note.image)
+            symbols += 1
+
+    return {'path': path, 'output': scan_dir, 'staffs': len(staffs), 'symbols': symbols}
+
+
+def ignore_signals():
+    """
+    Inicjalizator procesów roboczych: Ctrl-C (wysyłane do całej grupy procesów) i SIGTERM
+    są ignorowane – zatrzymaniem i dokończeniem zadań steruje proces główny.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+class ScanJournal:
+    """
+    Dziennik przetworzonych skanów zapisywany jako JSON:
+      - scans: hash zawartości -> podsumowanie przetwarzania,
+      - files: ścieżka -> (rozmiar, mtime_ns, hash), żeby po restarcie nie liczyć
+        ponownie hashy plików, które się nie zmieniły.
+    Zapis jest atomowy (plik tymczasowy + os.replace), więc przerwanie demona nie psuje dziennika.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.scans = {}
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.scans = data.get('scans', {})
+            self.files = data.get('files', {})
+
+    def digest_for(self, path):
+        """
+        Hash pliku – z dziennika, jeśli rozmiar i czas modyfikacji się nie zmieniły.
+        """
+        st = os.stat(path)
+        cached = self.files.get(path)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = file_digest(path)
+        self.files[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def __contains__(self, digest):
+        return digest in self.scans
+
+    def record(self, digest, summary):
+        summary['processed_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.scans[digest] = summary
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'scans': self.scans, 'files': self.files}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class ScanWatcher:
+    """
+    Obserwuje katalog ze skanami i przetwarza nowe lub zmienione obrazy w puli procesów.
+    Zdarzenia pochodzą z inotify (zamknięcie pliku po zapisie, przeniesienie do katalogu),
+    a bez inotify katalog jest odpytywany co poll_interval sekund – wtedy plik trafia do
+    przetwarzania dopiero, gdy jego rozmiar i mtime nie zmieniają się przez settle_time sekund.
+
+    Awaria procesu roboczego (np. zabicie przez OOM) nie jest wynikiem przetwarzania: skany
+    z zepsutej puli nie trafiają do dziennika, pula jest tworzona od nowa, a skany wracają do
+    kolejki i są ponawiane pojedynczo (wtedy wiadomo, który skan zabija proces). Skan, który
+    samodzielnie zabije proces max_crashes razy, czeka na restart demona.
+    SIGINT i SIGTERM zatrzymują demona po dokończeniu zadań w toku; drugi sygnał przerywa od razu.
+    """
+    def __init__(self, watch_dir, output_dir, journal_path=None, profile=DEFAULT_PROFILE,
+                 workers=None, poll_interval=2.0, settle_time=2.0, use_inotify=True, slow_pages=None,
+                 max_crashes=3):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.journal = ScanJournal(journal_path or os.path.join(self.output_dir, 'journal.json'))
+        self.profile = profile
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.use_inotify = use_inotify and INotify is not None
+        self.slow_pages = slow_pages
+        self.max_crashes = max_crashes
+
+        self.executor = None
+        self.stopping = False
+        self.crashes = {}  # hash -> liczba awarii procesu podczas samodzielnego przetwarzania skanu
+        self.retry = collections.deque()  # (ścieżka, hash) skanów z zepsutej puli – ponawiane pojedynczo
+        self.deferred = []  # ścieżki wstrzymane na czas ponawiania
+        self.solo = None  # future skanu ponawianego pojedynczo
+
+        self.in_flight = {}  # future -> (ścieżka, hash)
+        self.queued = set()  # hashe wysłane do puli
+        self.pending = {}  # ścieżka -> (rozmiar, mtime_ns, czas od którego plik się nie zmienia)
+
+    def list_images(self):
+        paths = []
+        for name in sorted(os.listdir(self.watch_dir)):
+            path = os.path.join(self.watch_dir, name)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(path):
+                paths.append(path)
+        return paths
+
+    def start_pool(self):
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_signals)
+
+    def restart_pool(self):
+        print("Proces roboczy przestał działać – tworzę nową pulę")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.start_pool()
+
+    def request_stop(self, signum, frame):
+        if self.stopping:
+            raise KeyboardInterrupt
+        print(f"Otrzymano {signal.Signals(signum).name} – zatrzymywanie po dokończeniu zadań w toku...")
+        self.stopping = True
+
+    def submit(self, path, solo=False):
+        try:
+            digest = self.journal.digest_for(path)
+        except OSError as e:  # plik zniknął lub jest niedostępny
+            print(f"Pominięto {path}: {e}")
+            return
+        if digest in self.journal or digest in self.queued:
+            return
+        if self.crashes.get(digest, 0) >= self.max_crashes:
+            return
+        if not solo and (self.retry or self.solo is not None):
+            # Trwa ponawianie po awarii – nowe skany czekają, żeby nie dzielić z nim puli
+            if any(d == digest for _, d in self.retry):
+                return
+            if path not in self.deferred:
+                self.deferred.append(path)
+            return
+
+        args = (process_scan, path, digest, self.output_dir, self.profile, self.slow_pages)
+        try:
+            future = self.executor.submit(*args)
+        except BrokenProcessPool:
+            self.restart_pool()
+            future = self.executor.submit(*args)
+        self.queued.add(digest)
+        self.in_flight[future] = (path, digest)
+        if solo:
+            self.solo = future
+
+    def collect(self, timeout=0):
+        """
+        Odbiera wyniki zakończonych zadań i zapisuje je w dzienniku (tylko w procesie głównym).
+        Do dziennika trafiają wyniki i błędy potoku, ale nie awarie puli procesów.
+        """
+        if self.in_flight:
+            done, _ = concurrent.futures.wait(list(self.in_flight), timeout=timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path, digest = self.in_flight.pop(future)
+                self.queued.discard(digest)
+                solo = future is self.solo
+                if solo:
+                    self.solo = None
+                try:
+                    summary = future.result()
+                except (BrokenProcessPool, KeyboardInterrupt, SystemExit) as e:
+                    # Awaria puli, nie skanu – bez wpisu do dziennika, skan wraca do kolejki
+                    broken = True
+                    if solo:
+                        self.crashes[digest] = self.crashes.get(digest, 0) + 1
+                        if self.crashes[digest] >= self.max_crashes:
+                            print(f"Pominięto {path}: proces roboczy padł {self.crashes[digest]} razy ({e!r}), "
+                                  f"ponowna próba po restarcie demona")
+                            continue
+                    self.retry.append((path, digest))
+                    continue
+                except Exception as e:
+                    # Błąd potoku trafia do dziennika – zmieniony plik dostanie nowy hash i wróci do kolejki
+                    summary = {'path': path, 'error': repr(e)}
+                if 'error' in summary:
+                    print(f"Błąd przetwarzania {path}: {summary['error']}")
+                else:
+                    print(f"Przetworzono {path}: pięciolinie {summary['staffs']}, symbole {summary['symbols']}")
+                self.journal.record(digest, summary)
+
+            if broken and not self.stopping:
+                self.restart_pool()
+
+        if not self.stopping:
+            self.resume()
+
+    def resume(self):
+        """
+        Po awarii puli: gdy pula jest pusta, uruchamia pojedynczo kolejny podejrzany skan,
+        a po wyczerpaniu kolejki ponowień wysyła wstrzymane skany.
+        """
+        if self.in_flight:
+            return
+        if self.retry:
+            path, _ = self.retry.popleft()
+            self.submit(path, solo=True)
+        elif self.deferred:
+            deferred, self.deferred = self.deferred, []
+            for path in deferred:
+                self.submit(path)
+
+    def poll(self):
+        """
+        Jeden przebieg odpytywania: pliki stabilne przez settle_time trafiają do puli.
+        """
+        now = time.monotonic()
+        for path in self.list_images():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            cached = self.journal.files.get(path)
+            if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                if cached[2] in self.journal or cached[2] in self.queued:
+                    self.pending.pop(path, None)
+                    continue
+
+            state = (st.st_size, st.st_mtime_ns)
+            previous = self.pending.get(path)
+            if previous is None or previous[:2] != state:
+                self.pending[path] = state + (now,)
+            elif now - previous[2] >= self.settle_time:
+                del self.pending[path]
+                self.submit(path)
+
+    def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        mode = "inotify" if self.use_inotify else f"odpytywanie co {self.poll_interval} s"
+        print(f"Obserwuję {self.watch_dir} ({mode}), wyniki w {self.output_dir}")
+
+        self.stopping = False
+        previous_handlers = {sig: signal.signal(sig, self.request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        self.start_pool()
+        try:
+            if self.use_inotify:
+                self.run_inotify()
+            else:
+                self.run_polling()
+            # Dokończenie zadań w toku, żeby ich wyniki trafiły do dziennika
+            while self.in_flight:
+                self.collect(timeout=None)
+        except KeyboardInterrupt:
+            print("Przerwano bez dokończenia zadań w toku")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.journal.save()
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+    def run_polling(self):
+        while not self.stopping:
+            self.poll()
+            self.collect(timeout=self.poll_interval)
+            if not self.in_flight and not self.stopping:
+                time.sleep(self.poll_interval)
+
+    def run_inotify(self):
+        inotify = INotify()
+        inotify.add_watch(self.watch_dir, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+
+        # Pliki, które pojawiły się, gdy demon nie działał
+        for path in self.list_images():
+            self.submit(path)
+
+        try:
+            while not self.stopping:
+                for event in inotify.read(timeout=int(self.poll_interval * 1000)):
+                    if os.path.splitext(event.name)[1].lower() in IMAGE_EXTENSIONS:
+                        self.submit(os.path.join(self.watch_dir, event.name))
+                self.collect()
+        finally:
+            inotify.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Przetwarzanie nowych skanów pojawiających się w katalogu")
+    parser.add_argument('watch_dir', help="katalog, do którego skanery zapisują pliki")
+    parser.add_argument('--output', default='output', help="katalog na wycięte pięciolinie i nuty")
+    parser.add_argument('--journal', help="plik dziennika (domyślnie <output>/journal.json)")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, choices=list(PROFILES))
+    parser.add_argument('--workers', type=int, help="liczba procesów roboczych (domyślnie liczba rdzeni)")
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--settle-time', type=float, default=2.0)
+    parser.add_argument('--no-inotify', action='store_true', help="wymusza odpytywanie katalogu")
+    parser.add_argument('--slow-page-dir', help="katalog na zrzuty stron przekraczających budżet")
+    parser.add_argument('--slow-page-budget', type=float, default=5.0, help="budżet czasu etapu [s]")
+    args = parser.parse_args()
+
+    slow_pages = None
+    if args.slow_page_dir:
+        slow_pages = {'spill_dir': args.slow_page_dir, 'time_budget': args.slow_page_budget}
+
+    ScanWatcher(args.watch_dir, args.output, journal_path=args.journal, profile=args.profile,
+                workers=args.workers, poll_interval=args.poll_interval, settle_time=args.settle_time,
+                use_inotify=not args.no_inotify, slow_pages=slow_pages).run()